@@ -1,12 +1,28 @@
-# import os
+import logging as lg
+import threading
+import time
+import numpy as np
 import pandas as pd
 import torch
-from transformers import BertTokenizer, BertForSequenceClassification
-from torch.utils.data import DataLoader, TensorDataset
+from transformers import BertTokenizerFast, BertForSequenceClassification
 
 # Model directory
 MODEL_DIR = "/Users/adam/Documents/Python/unused_reddit/Saved_model"
 
+# serializes tokenizer calls and forward passes (ETL cycle and scoring endpoint
+# share them, the Rust tokenizer fails on concurrent calls with truncation)
+MODEL_LOCK = threading.Lock()
+
+# model output columns
+TOXICITY_LABELS = [
+    "toxic",
+    "severe_toxic",
+    "obscene",
+    "threat",
+    "insult",
+    "identity_hate",
+]
+
 # load device
 device = torch.device(
     "cuda"
@@ -16,102 +32,156 @@ device = torch.device(
     else "cpu"
 )
 
-# load BERT tokenizer and model
-BERT_TOKENIZER = BertTokenizer.from_pretrained(MODEL_DIR)
+# load BERT tokenizer (Rust backed, batch encoding runs in parallel) and model
+BERT_TOKENIZER = BertTokenizerFast.from_pretrained(MODEL_DIR)
 BERT_MODEL = BertForSequenceClassification.from_pretrained(MODEL_DIR, num_labels=6).to(
     device
 )
 
 
+def encode_texts(texts, tokenizer=BERT_TOKENIZER, max_length=512):
+    """Function to get token ids of texts in one batched call
+    (the fast tokenizer encodes the batch in parallel). Call it under MODEL_LOCK.
+    Args:
+        texts (list): List of text strings to encode.
+        tokenizer (BertTokenizerFast): Tokenizer for BERT model.
+        max_length (int): Maximum number of tokens kept per text.
+    Returns:
+        list: List of token id lists (not padded), one per text.
+    """
+    return tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+
+
 def classify_toxicity_multilabel(
-    texts, tokenizer=BERT_TOKENIZER, model=BERT_MODEL, device=device, batch_size=32
+    texts,
+    tokenizer=BERT_TOKENIZER,
+    model=BERT_MODEL,
+    device=device,
+    batch_size=32,
+    timings=None,
 ):
     """Function to classify toxicity of texts using a pre-trained BERT model.
     Args:
         texts (list): List of text strings to classify.
-        tokenizer (BertTokenizer): Tokenizer for BERT model.
+        tokenizer (BertTokenizerFast): Tokenizer for BERT model.
         model (BertForSequenceClassification): Pre-trained BERT model.
         device (torch.device): Device to run the model on.
         batch_size (int): Batch size for processing texts.
+        timings (dict, optional): Accumulates 'tokenize' and 'forward' seconds
+            (measured after MODEL_LOCK is acquired, waiting for it is not counted).
     Returns:
-        list: List of toxicity scores for each text.
+        np.ndarray: float32 array (len(texts), 6) with toxicity scores for each text.
     """
+    if timings is None:
+        timings = {}
+    timings.setdefault("tokenize", 0.0)
+    timings.setdefault("forward", 0.0)
+
     model.eval()
-    encodings = tokenizer(
-        texts, truncation=True, padding=True, return_tensors="pt", max_length=512
-    )
-    dataset = TensorDataset(encodings["input_ids"], encodings["attention_mask"])
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
+    with MODEL_LOCK:
+        start = time.time()
+        token_ids = encode_texts(texts, tokenizer=tokenizer)
+        timings["tokenize"] += time.time() - start
 
-    all_predictions = []
+    all_predictions = np.empty(
+        (len(token_ids), len(TOXICITY_LABELS)), dtype=np.float32
+    )
 
-    for batch in dataloader:
-        input_ids, attention_mask = [t.to(device) for t in batch]
-        with torch.no_grad():
+    for i in range(0, len(token_ids), batch_size):
+        # pad each batch only to its own longest text
+        with MODEL_LOCK:
+            start = time.time()
+            batch = tokenizer.pad(
+                {"input_ids": token_ids[i : i + batch_size]}, return_tensors="pt"
+            )
+            timings["tokenize"] += time.time() - start
+        input_ids = batch["input_ids"].to(device)
+        attention_mask = batch["attention_mask"].to(device)
+
+        with MODEL_LOCK, torch.no_grad():
+            start = time.time()
             outputs = model(input_ids, attention_mask=attention_mask)
             logits = outputs.logits
             predictions = torch.sigmoid(logits).cpu().numpy()
-            all_predictions.extend(predictions)
+            all_predictions[i : i + len(predictions)] = predictions
+        timings["forward"] += time.time() - start
 
     return all_predictions
 
 
-def run_toxicity_analysis(df, chunk_size=128):
+def run_toxicity_analysis(df, chunk_size=128, on_chunk=None, deadline=None):
     """Function to run toxicity analysis on a DataFrame of Reddit posts.
+    Scores are written chunk by chunk into one preallocated float32 array,
+    so memory use stays flat regardless of the number of posts.
+    Rows are scored in DataFrame order - sort df first to score important posts first.
     Args:
         df (pd.DataFrame): DataFrame containing Reddit posts with 'post_id' and 'body' columns.
         chunk_size (int): Number of posts to process in each batch.
+        on_chunk (callable, optional): Called with the results DataFrame of every chunk
+            as soon as it is scored (ex.: to insert it right away).
+        deadline (float, optional): time.time() after which no new chunk is started;
+            remaining rows are left unscored.
     Returns:
-        pd.DataFrame: DataFrame with toxicity scores added.
+        pd.DataFrame: DataFrame with 'post_id' and float32 toxicity score columns
+            (only rows scored before the deadline).
     """
     # Check if the input DataFrame is empty
     if df.empty:
         return pd.DataFrame()
 
-    # Create a new DataFrame to store the results
-    results_df = df[["post_id", "body"]].copy()
-
-    # Initialize columns for toxicity scores
-    for col in [
-        "toxic",
-        "severe_toxic",
-        "obscene",
-        "threat",
-        "insult",
-        "identity_hate",
-        "overall_toxicity",
-    ]:
-        results_df[col] = None
+    # toxicity scores + overall_toxicity
+    scores = np.empty((len(df), len(TOXICITY_LABELS) + 1), dtype=np.float32)
+    post_ids = df["post_id"].to_numpy()
+    bodies = df["body"]
+
+    timings = {"tokenize": 0.0, "forward": 0.0}
 
     # Process posts in chunks
-    for start in range(0, len(results_df), chunk_size):
-        end = start + chunk_size
-        df_chunk = results_df.iloc[start:end]
-        texts = df_chunk["body"].fillna("").tolist()
-
-        # returns a list of dictionaries with toxicity scores
-        toxicity_scores = classify_toxicity_multilabel(texts)
-
-        # Create a DataFrame from the toxicity scores
-        toxicity_df = pd.DataFrame(
-            toxicity_scores,
-            columns=[
-                "toxic",
-                "severe_toxic",
-                "obscene",
-                "threat",
-                "insult",
-                "identity_hate",
-            ],
-        )
-        toxicity_df["overall_toxicity"] = toxicity_df.max(axis=1)
-
-        # Update the results_df with the new scores
-        results_df.loc[df_chunk.index, toxicity_df.columns] = toxicity_df.values
+    scored = 0
+    for start in range(0, len(df), chunk_size):
+        if deadline is not None and time.time() > deadline:
+            break
+        end = min(start + chunk_size, len(df))
+        texts = bodies.iloc[start:end].fillna("").tolist()
+
+        scores[start:end, :-1] = classify_toxicity_multilabel(texts, timings=timings)
+        scores[start:end, -1] = scores[start:end, :-1].max(axis=1)
+        scored = end
+
+        if on_chunk is not None:
+            on_chunk(_results_frame(post_ids[start:end], scores[start:end]))
+
+    lg.info(
+        "Scored %d of %d posts: tokenize %.2fs, forward %.2fs",
+        scored,
+        len(df),
+        timings["tokenize"],
+        timings["forward"],
+    )
+    return _results_frame(post_ids[:scored], scores[:scored])
+
 
+def _results_frame(post_ids, scores):
+    results_df = pd.DataFrame(scores, columns=TOXICITY_LABELS + ["overall_toxicity"])
+    results_df.insert(0, "post_id", post_ids)
     return results_df
 
 
+def score_texts(texts):
+    """Function to score arbitrary texts (used by the on-demand scoring endpoint).
+    Args:
+        texts (list): List of text strings to classify.
+    Returns:
+        list: List of dictionaries with toxicity scores for each text.
+    """
+    results = []
+    for scores in classify_toxicity_multilabel(texts):
+        row = {label: float(score) for label, score in zip(TOXICITY_LABELS, scores)}
+        row["overall_toxicity"] = float(scores.max())
+        results.append(row)
+    return results
+
+
 if __name__ == "__main__":
     # Example usage
     df = pd.read_csv(
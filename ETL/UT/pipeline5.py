@@ -0,0 +1,181 @@
+import logging as lg
+import queue
+import threading
+import time
+
+# end-of-stream marker passed down the queues
+_DONE = object()
+# stage threads are named with this prefix
+_THREAD_PREFIX = "pipeline-"
+
+
+class _StageLogFilter(lg.Filter):
+    """Demotes INFO records logged from stage threads to DEBUG.
+    Stage functions are the regular ETL steps, called once per item, so their
+    INFO lines would flood the log. Warnings and errors are kept."""
+
+    def filter(self, record):
+        if record.levelno == lg.INFO and record.threadName.startswith(_THREAD_PREFIX):
+            record.levelno, record.levelname = lg.DEBUG, "DEBUG"
+            return lg.getLogger().isEnabledFor(lg.DEBUG)
+        return True
+
+
+class StageStats:
+    """Timing and queue statistics collected for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0  # time spent doing work
+        self.starved = 0.0  # time stalled waiting for upstream items
+        self.blocked = 0.0  # time stalled waiting for room downstream
+        self.max_queue_depth = 0  # max size of the input queue seen
+        self.queue_depth_sum = 0  # to compute average input queue depth
+
+    def avg_queue_depth(self):
+        return self.queue_depth_sum / self.items if self.items else 0.0
+
+
+def _put(out_queue, item, stats):
+    start = time.time()
+    out_queue.put(item)
+    stats.blocked += time.time() - start
+
+
+def _run_source(source, out_queue, stats):
+    """Pulls items from an iterable (ex.: scraper) and feeds the first queue."""
+    try:
+        items = iter(source)
+        while True:
+            start = time.time()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            stats.busy += time.time() - start
+            stats.items += 1
+            _put(out_queue, item, stats)
+    except Exception as e:
+        lg.error("Pipeline stage '%s' failed: %s", stats.name, e)
+    finally:
+        out_queue.put(_DONE)
+
+
+def _run_stage(func, in_queue, out_queue, stats):
+    """Applies func to every item of in_queue, results go to out_queue (if any).
+    None results are not passed downstream. A failing item is logged and skipped,
+    so upstream stages never block on a dead consumer.
+    """
+    while True:
+        start = time.time()
+        item = in_queue.get()
+        stats.starved += time.time() - start
+        if item is _DONE:
+            break
+
+        depth = in_queue.qsize()
+        stats.max_queue_depth = max(stats.max_queue_depth, depth)
+        stats.queue_depth_sum += depth
+        stats.items += 1
+
+        start = time.time()
+        try:
+            result = func(item)
+        except Exception as e:
+            lg.error("Pipeline stage '%s' failed on item: %s", stats.name, e)
+            result = None
+        stats.busy += time.time() - start
+
+        if out_queue is not None and result is not None:
+            _put(out_queue, result, stats)
+
+    if out_queue is not None:
+        out_queue.put(_DONE)
+
+
+def batched(items, size):
+    """Groups items of an iterable into lists of up to size items (last one shorter),
+    so per-item fixed costs (DB round trips, transactions) are paid once per batch."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def log_pipeline_report(all_stats, wall_time):
+    """Logs per stage work / stall time and queue depths."""
+    for stats in all_stats:
+        lg.info(
+            "STAGE '%s': %d items, busy %.2fs, starved %.2fs, blocked %.2fs, "
+            "queue depth avg %.1f / max %d",
+            stats.name,
+            stats.items,
+            stats.busy,
+            stats.starved,
+            stats.blocked,
+            stats.avg_queue_depth(),
+            stats.max_queue_depth,
+        )
+    lg.info(
+        "PIPELINE WALL TIME %.2fs (sum of stages %.2fs, slowest stage %.2fs)",
+        wall_time,
+        sum(stats.busy for stats in all_stats),
+        max(stats.busy for stats in all_stats),
+    )
+
+
+def run_pipeline(source, stages, source_name="source", queue_size=4):
+    """Runs a source and a chain of stages concurrently, one thread per stage,
+    connected with bounded queues (backpressure when a stage falls behind).
+    INFO logs of the stages (per item) are demoted to DEBUG while it runs.
+
+    Args:
+        source (iterable): Produces the items (ex.: one scraped submission at a time).
+        stages (list): List of (name, func) tuples applied in order.
+        source_name (str): Name of the source stage used in the report.
+        queue_size (int): Maximum number of items waiting between two stages.
+
+    Returns:
+        list: StageStats of the source and every stage.
+    """
+    start_time = time.time()
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    all_stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+
+    threads = [
+        threading.Thread(
+            target=_run_source,
+            args=(source, queues[0], all_stats[0]),
+            name=source_name,
+            daemon=True,
+        )
+    ]
+    for i, (name, func) in enumerate(stages):
+        out_queue = queues[i + 1] if i + 1 < len(queues) else None
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(func, queues[i], out_queue, all_stats[i + 1]),
+                name=_THREAD_PREFIX + name,
+                daemon=True,
+            )
+        )
+
+    log_filter = _StageLogFilter()
+    lg.getLogger().addFilter(log_filter)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        lg.getLogger().removeFilter(log_filter)
+
+    log_pipeline_report(all_stats, time.time() - start_time)
+    return all_stats
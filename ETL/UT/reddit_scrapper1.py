@@ -1,4 +1,7 @@
+import json
 import logging as lg
+import math
+import os
 import time
 import pandas as pd
 import praw
@@ -96,40 +99,244 @@ def get_reddit_cr(credentials_file_path):
     return reddit
 
 
-def collect_reddit_data(reddit_connection, subreddit_name, limit=10):
-    """Collects data from a specified subreddit.
+def load_scrape_stats(stats_path):
+    """Reads per-community scrape statistics saved by previous runs.
+
+    Returns:
+        dict: {community: stats} or an empty dict if there is no (valid) file yet.
+    """
+    try:
+        with open(stats_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_scrape_stats(scrape_stats, stats_path):
+    """Writes per-community scrape statistics for the next run."""
+    os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+    with open(stats_path, "w", encoding="utf-8") as file:
+        json.dump(scrape_stats, file)
+
+
+def plan_scrape_budget(
+    community_stats, max_limit=1000, min_limit=25, safety=1.5, now=None
+):
+    """Derives how many of the newest submissions to page through.
+
+    Budget covers submissions expected since the last run (arrival rate x elapsed time)
+    plus the ones still inside the activity window (threads old enough that they
+    still got new comments last time), with a safety margin.
+
+    Args:
+        community_stats (dict): Statistics of the community from previous runs.
+        max_limit (int): Upper bound (Reddit listings stop at 1000).
+        min_limit (int): Lower bound, keeps a small sweep even for quiet communities.
+        safety (float): Multiplier on the expected number of submissions.
+
+    Returns:
+        int: Number of submissions to request.
+    """
+    if not community_stats.get("last_run"):
+        return max_limit
+
+    now = now or time.time()
+    hours_since_run = (now - community_stats["last_run"]) / 3600
+    arrival_rate = community_stats.get("arrival_rate", 0.0)
+    activity_window = community_stats.get("activity_window_hours", 0.0)
+
+    expected = arrival_rate * (hours_since_run + activity_window) * safety
+    return int(min(max(math.ceil(expected), min_limit), max_limit))
+
+
+def _ewma(previous, observed, alpha=0.5):
+    return observed if previous is None else alpha * observed + (1 - alpha) * previous
+
+
+def _update_community_stats(community_stats, submissions, threads, active_ages, now):
+    """Updates arrival rate, activity window and tracked threads after a run."""
+    created = [submission.created_utc for submission in submissions]
+    last_run = community_stats.get("last_run")
+    prev_newest = community_stats.get("newest_created", 0)
+    prev_rate = community_stats.get("arrival_rate")
+
+    if last_run:
+        arrivals = sum(c > prev_newest for c in created)
+        hours = (now - last_run) / 3600
+    else:
+        arrivals = len(created)
+        hours = (now - min(created)) / 3600 if created else 0
+
+    arrival_rate = arrivals / hours if hours > 0 else 0.0
+    if last_run and created and arrivals >= len(created) and prev_rate:
+        # whole listing was new - real rate is higher than observed
+        arrival_rate = max(arrival_rate, prev_rate * 2)
+
+    community_stats["last_run"] = now
+    community_stats["newest_created"] = max(created, default=prev_newest)
+    community_stats["arrival_rate"] = _ewma(prev_rate, arrival_rate)
+    if not last_run:
+        # first run - every listed thread may still be active
+        active_ages = [(now - c) / 3600 for c in created]
+    community_stats["activity_window_hours"] = _ewma(
+        community_stats.get("activity_window_hours"), max(active_ages, default=0.0)
+    )
+    # threads outside the listing are no longer tracked
+    community_stats["threads"] = threads
+
+
+def iter_reddit_data(
+    reddit_connection,
+    subreddit_name,
+    limit=10,
+    community_stats=None,
+    min_new_comments=1,
+    min_limit=25,
+    recent_hours=24,
+    refresh_every_runs=6,
+):
+    """Yields scraped data of a subreddit one submission at a time.
+
+    With community_stats (adaptive mode) the listing size comes from plan_scrape_budget
+    (capped by limit). Every listed submission is yielded, but the comments of an
+    already known thread are re-fetched only if it got at least min_new_comments
+    since the last run, was active in the last recent_hours, or was not expanded for
+    refresh_every_runs runs. Otherwise only the submission row (taken from the
+    listing, no extra API call) is yielded, marked with comments_fetched=False.
+    community_stats is updated in place; a thread is recorded only after its data
+    was yielded.
 
     Args:
         reddit_connection (object): Reddit API instance.
         subreddit_name (str): Name of the subreddit to scrape data from.
         limit (int, optional): Maximum number of posts to scrape from the subreddit. Defaults to 10.
-
-    Returns:
-        List: Scraped data as a list of dictionaries.
+        community_stats (dict, optional): Statistics of the community from previous runs.
+        min_new_comments (int, optional): New comments needed to re-expand a known thread.
+        min_limit (int, optional): Smallest listing size in adaptive mode.
+        recent_hours (float, optional): Threads active this recently are always re-expanded.
+        refresh_every_runs (int, optional): Re-expand quiet threads every N runs
+            (catches edited comments).
+
+    Yields:
+        List: Scraped data (submission + all its comments) as a list of dictionaries.
     """
 
     lg.info("Data collection start...")
 
-    all_data = []
+    now = time.time()
+    adaptive = community_stats is not None
+    if adaptive:
+        limit = plan_scrape_budget(
+            community_stats, max_limit=limit, min_limit=min_limit, now=now
+        )
+        lg.info(
+            "Scrape budget for '%s': %d submissions (arrival rate %.2f/h, "
+            "activity window %.1fh)",
+            subreddit_name,
+            limit,
+            community_stats.get("arrival_rate", 0.0),
+            community_stats.get("activity_window_hours", 0.0),
+        )
+    known_threads = community_stats.get("threads", {}) if adaptive else {}
+    threads = {}
+    active_ages = []
+    new_cn = hot_cn = refresh_cn = quiet_cn = 0
 
     subreddit_obj = reddit_connection.subreddit(subreddit_name)
     new_submissions = list(subreddit_obj.new(limit=limit))
 
     try:
         for submission in new_submissions:
-            get_submission_details(submission, all_data)
-
-            submission.comments.replace_more(limit=0)
-            for comment in submission.comments:
-                get_comment_details(comment, submission.id, all_data)
-
-            time.sleep(2)
+            known = known_threads.get(submission.id)
+            if known is None:
+                expand = True
+                last_active = now
+                new_cn += 1
+            else:
+                last_active = known.get("last_active", 0)
+                runs_since_expand = known.get("runs_since_expand", 0) + 1
+                if submission.num_comments - known["num_comments"] >= min_new_comments:
+                    expand = True
+                    last_active = now
+                    hot_cn += 1
+                    active_ages.append((now - submission.created_utc) / 3600)
+                elif (
+                    now - last_active <= recent_hours * 3600
+                    or runs_since_expand >= refresh_every_runs
+                ):
+                    expand = True
+                    refresh_cn += 1
+                else:
+                    expand = False
+                    quiet_cn += 1
+
+            submission_data = []
+            get_submission_details(submission, submission_data)
+
+            if expand:
+                submission.comments.replace_more(limit=0)
+                for comment in submission.comments:
+                    get_comment_details(comment, submission.id, submission_data)
+            else:
+                submission_data[0]["comments_fetched"] = False
+
+            yield submission_data
+
+            if expand:
+                threads[submission.id] = {
+                    "num_comments": submission.num_comments,
+                    "last_active": last_active,
+                    "runs_since_expand": 0,
+                }
+                time.sleep(2)
+            else:
+                threads[submission.id] = dict(
+                    known, runs_since_expand=runs_since_expand
+                )
 
         lg.info("Data collection end. ")
 
     except Exception as e:
         lg.error("Error during data collection: %s", e)
 
+    if adaptive:
+        lg.info(
+            "Listed %d submissions: expanded %d new + %d hot + %d recent/refresh, "
+            "%d quiet (submission row only)",
+            len(new_submissions),
+            new_cn,
+            hot_cn,
+            refresh_cn,
+            quiet_cn,
+        )
+        _update_community_stats(
+            community_stats, new_submissions, threads, active_ages, now
+        )
+
+
+def collect_reddit_data(
+    reddit_connection, subreddit_name, limit=10, community_stats=None, **adaptive_kw
+):
+    """Collects data from a specified subreddit.
+
+    Args:
+        reddit_connection (object): Reddit API instance.
+        subreddit_name (str): Name of the subreddit to scrape data from.
+        limit (int, optional): Maximum number of posts to scrape from the subreddit. Defaults to 10.
+        community_stats (dict, optional): Enables adaptive budget, see iter_reddit_data.
+        **adaptive_kw: min_new_comments / min_limit / recent_hours / refresh_every_runs
+            passed to iter_reddit_data.
+
+    Returns:
+        List: Scraped data as a list of dictionaries.
+    """
+
+    all_data = []
+    for submission_data in iter_reddit_data(
+        reddit_connection, subreddit_name, limit, community_stats, **adaptive_kw
+    ):
+        all_data.extend(submission_data)
+
     return all_data
 
 
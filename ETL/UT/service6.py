@@ -0,0 +1,140 @@
+import json
+import logging as lg
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# stop marker for the batching thread
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects texts of concurrent requests and scores them in one model call.
+
+    A batch is flushed when it reaches max_batch_size texts or when the first
+    request in it has waited max_wait_ms.
+    """
+
+    def __init__(self, score_func, max_batch_size=64, max_wait_ms=20):
+        self.score_func = score_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts, timeout=60):
+        """Scores texts, blocks until the batch containing them is processed."""
+        future = Future()
+        self._requests.put((texts, future))
+        return future.result(timeout=timeout)
+
+    def stop(self):
+        self._requests.put(_STOP)
+        self._thread.join()
+
+    def _next_batch(self):
+        first = self._requests.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        batch_size = len(first[0])
+        deadline = time.time() + self.max_wait
+
+        while batch_size < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._requests.put(_STOP)  # finish this batch, stop afterwards
+                break
+            batch.append(item)
+            batch_size += len(item[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            all_texts = [text for texts, _ in batch for text in texts]
+            try:
+                scores = self.score_func(all_texts)
+            except Exception as e:
+                lg.error("Scoring of %d texts failed: %s", len(all_texts), e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for texts, future in batch:
+                future.set_result(scores[offset : offset + len(texts)])
+                offset += len(texts)
+            lg.info("Scored %d texts from %d requests", len(all_texts), len(batch))
+
+
+def _make_handler(batcher):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                texts = json.loads(self.rfile.read(length))["texts"]
+                if not isinstance(texts, list) or not all(
+                    isinstance(text, str) for text in texts
+                ):
+                    raise ValueError("'texts' must be a list of strings")
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            try:
+                scores = batcher.submit(texts) if texts else []
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"scores": scores})
+
+        def log_message(self, format, *args):
+            lg.debug("Scoring endpoint: " + format, *args)
+
+    return ScoringHandler
+
+
+def start_scoring_server(batcher, host="127.0.0.1", port=8765):
+    """Starts the local HTTP scoring endpoint in a background thread.
+
+    Endpoints:
+        POST /score  {"texts": ["...", ...]} -> {"scores": [{"toxic": ..., ...}, ...]}
+        GET  /health -> {"status": "ok"}
+
+    Returns:
+        ThreadingHTTPServer: running server (call .shutdown() to stop it).
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    lg.info("Scoring endpoint listening on http://%s:%d", host, port)
+    return server
@@ -1,4 +1,5 @@
 import logging as lg
+import uuid
 import pandas as pd
 
 from sqlalchemy import create_engine
@@ -74,6 +75,114 @@ def get_existing_username_mapping(engine_instance):
         return known_users.DataFrame(columns=["original_author", "new_username"])
 
 
+def get_username_mapping_for(engine_instance, authors):
+    """Get username mapping (author -> new_username) only for the given authors
+    Args:
+        engine_instance: A SQLAlchemy engine instance connected to the target database.
+        authors (list): Original author names present in the current batch.
+    Returns:
+        tuple: (pd.DataFrame with 'original_author' and 'new_username' columns,
+                last generated new_username or None if the table is empty).
+    Raises:
+        Exception: If the query fails - without the last username new IDs would
+                   collide with existing ones, so the run must not continue.
+    """
+    try:
+        known_users = pd.read_sql(
+            text(
+                "SELECT original_author, new_username FROM unique_authors "
+                "WHERE original_author = ANY(:authors)"
+            ),
+            engine_instance,
+            params={"authors": list(authors)},
+        )
+        last_username = pd.read_sql(
+            "SELECT MAX(new_username) AS last_username FROM unique_authors",
+            engine_instance,
+        )["last_username"].iloc[0]
+    except Exception as e:
+        lg.error("Could not fetch username mapping from DB: %s", e)
+        raise
+    return known_users, None if pd.isna(last_username) else last_username
+
+
+def get_existing_post_hashes(engine_instance):
+    """
+    Fetches change-detection state (body hash, last seen score, deleted flag) of stored posts.
+    Rows stored before 'body_hash' existed are hashed in the query (md5 of the UTF-8
+    body, same as transform2.hash_text), so they compare like any other row.
+
+    Args:
+        engine_instance: A SQLAlchemy engine instance connected to the target database.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'post_id', 'body_hash', 'score' and 'deleted' columns.
+                      Returns an empty DataFrame if the query fails.
+    """
+    try:
+        return pd.read_sql(
+            "SELECT post_id, "
+            "COALESCE(body_hash, md5(COALESCE(body, ''))) AS body_hash, score, "
+            "COALESCE(deleted, FALSE) AS deleted FROM reddit_posts",
+            engine_instance,
+        )
+    except Exception as e:
+        lg.error("Could not fetch post hashes from DB: %s", e)
+        return pd.DataFrame(columns=["post_id", "body_hash", "score", "deleted"])
+
+
+def get_unscored_posts(engine_instance):
+    """
+    Fetches posts without toxicity results (new, deferred or with an edited body).
+    Bodies are not fetched - the backlog can be large, use get_post_bodies for the
+    posts actually being scored.
+
+    Args:
+        engine_instance: A SQLAlchemy engine instance connected to the target database.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'post_id', 'score', 'number_of_replies',
+                      'date' and 'time' columns. Returns an empty DataFrame if the query fails.
+    """
+    try:
+        return pd.read_sql(
+            "SELECT rp.post_id, rp.score, rp.number_of_replies, "
+            "rp.date, rp.time FROM reddit_posts rp "
+            "LEFT JOIN toxicity_results tr ON rp.post_id = tr.post_id "
+            "WHERE tr.post_id IS NULL",
+            engine_instance,
+        )
+    except Exception as e:
+        lg.error("Could not fetch unscored posts from DB: %s", e)
+        return pd.DataFrame(
+            columns=["post_id", "score", "number_of_replies", "date", "time"]
+        )
+
+
+def get_post_bodies(engine_instance, post_ids):
+    """
+    Fetches bodies of the given posts, in the order of post_ids.
+
+    Args:
+        engine_instance: A SQLAlchemy engine instance connected to the target database.
+        post_ids (list): Post IDs to fetch.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'post_id' and 'body' columns (posts no longer
+                      in the table are left out). Returns an empty DataFrame if the query fails.
+    """
+    try:
+        bodies = pd.read_sql(
+            text("SELECT post_id, body FROM reddit_posts WHERE post_id = ANY(:ids)"),
+            engine_instance,
+            params={"ids": list(post_ids)},
+        )
+        return pd.DataFrame({"post_id": list(post_ids)}).merge(bodies, on="post_id")
+    except Exception as e:
+        lg.error("Could not fetch post bodies from DB: %s", e)
+        return pd.DataFrame(columns=["post_id", "body"])
+
+
 ##########################################
 
 
@@ -81,19 +190,82 @@ def insert_data(data, engine_instance, table_name):
     """
     Inserts data into the specified table.
     Assumes duplicates have been filtered before calling this function.
+    Returns True if the insert succeeded (or there was nothing to insert).
     """
     try:
         df = data.copy()
         if df.empty:
             lg.info(f"No new records to insert into {table_name}.")
-            return
+            return True
 
         df.to_sql(
             table_name, engine_instance, if_exists="append", index=False, chunksize=500
         )
         lg.info(f"✅ {len(df)} records inserted into {table_name}.")
+        return True
     except Exception as e:
         lg.error(f"Insert into {table_name} failed: {e}")
+        return False
+
+
+def update_data(data, engine_instance, table_name, key_column, columns):
+    """
+    Bulk-updates existing rows of the specified table.
+    Rows are staged with to_sql and applied with a single UPDATE ... FROM,
+    only 'columns' are overwritten and rows are matched on 'key_column'.
+    NULL values in data keep the stored value.
+    The staging table has a unique name (concurrent runs don't share it) and is
+    created inside the transaction, so a failed update leaves nothing behind.
+    """
+    stage_table = f"{table_name}_stage_{uuid.uuid4().hex[:12]}"
+    try:
+        df = data[[key_column] + list(columns)].copy()
+        if df.empty:
+            lg.info(f"No records to update in {table_name}.")
+            return
+
+        set_clause = ", ".join(
+            f"{col} = COALESCE(s.{col}, t.{col})" for col in columns
+        )
+        with engine_instance.begin() as connection:
+            df.to_sql(
+                stage_table,
+                connection,
+                if_exists="replace",
+                index=False,
+                chunksize=500,
+            )
+            connection.execute(
+                text(
+                    f"UPDATE {table_name} AS t SET {set_clause} "
+                    f"FROM {stage_table} AS s "
+                    f"WHERE t.{key_column} = s.{key_column}"
+                )
+            )
+            connection.execute(text(f"DROP TABLE {stage_table}"))
+        lg.info(f"✅ {len(df)} records updated in {table_name}.")
+    except Exception as e:
+        lg.error(f"Update of {table_name} failed: {e}")
+
+
+def delete_data(keys, engine_instance, table_name, key_column):
+    """
+    Deletes rows of the specified table whose 'key_column' is in keys.
+    """
+    try:
+        keys = list(keys)
+        if not keys:
+            lg.info(f"No records to delete from {table_name}.")
+            return
+
+        with engine_instance.begin() as connection:
+            result = connection.execute(
+                text(f"DELETE FROM {table_name} WHERE {key_column} = ANY(:keys)"),
+                {"keys": keys},
+            )
+        lg.info(f"✅ {result.rowcount} records deleted from {table_name}.")
+    except Exception as e:
+        lg.error(f"Delete from {table_name} failed: {e}")
 
 
 ###########################################
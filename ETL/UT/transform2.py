@@ -1,11 +1,19 @@
 import string as st
+import hashlib
 import logging
+import time
+import numpy as np
 import pandas as pd
 
+# bodies Reddit shows for removed / deleted posts
+DELETED_BODIES = ["[deleted]", "[removed]"]
+
 
 # 1
 def clean_raw_data(df):
-    return df.dropna(subset=["author"]).copy()
+    # rows with deleted authors are kept: known posts get their score refreshed and
+    # are flagged 'deleted', filter_new_rows drops them before insert (author is NOT NULL)
+    return df.dropna(subset=["id"]).copy()
 
 
 # 2
@@ -52,10 +60,32 @@ def get_nr_of_replies(df):
     reply_cn = dict(zip(reply_cn["target_post_id"], reply_cn["replies_cn"]))
     df["number_of_replies"] = df["post_id"].map(reply_cn).fillna(0)
 
+    # submissions scraped without their comments - reply count unknown
+    if "comments_fetched" in df.columns:
+        df.loc[df["comments_fetched"].eq(False), "number_of_replies"] = None
+
     return df
 
 
 # 7
+def hash_text(value):
+    """Returns md5 hex digest of a text (None/NaN hashed as empty string)."""
+    text = value if isinstance(value, str) else ""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def create_body_hash_column(df):
+    df["body_hash"] = [hash_text(body) for body in df["body"]]
+    return df
+
+
+def create_deleted_column(df):
+    # post removed or author account deleted on Reddit
+    df["deleted"] = df["author"].isna() | df["body"].isin(DELETED_BODIES)
+    return df
+
+
+# 8
 def order_columns(df):
     desired_order = [
         "type",
@@ -72,6 +102,8 @@ def order_columns(df):
         "number_of_replies",
         "date",
         "time",
+        "body_hash",
+        "deleted",
     ]
     df = df[desired_order]
 
@@ -130,12 +162,50 @@ def transform_reddit_data(data_input):
     df = get_nr_of_replies(df)
 
     # 7
+    logging.info("Creating 'body_hash' column...")
+    df = create_body_hash_column(df)
+    logging.info("Creating 'deleted' column...")
+    df = create_deleted_column(df)
+
+    # 8
     logging.info("Ordering collumns...")
     df = order_columns(df)
 
     return df
 
 
+def prioritize_posts(df, half_life_hours=24, now=None):
+    """Orders posts for toxicity scoring: fresh, high-engagement posts first.
+
+    priority = (1 + log1p(score) + log1p(number_of_replies)) * 0.5 ** (age_hours / half_life_hours)
+
+    Args:
+        df (pd.DataFrame): Posts with 'score', 'number_of_replies', 'date' and 'time' columns.
+        half_life_hours (float): Age after which the priority of a post is halved.
+        now (pd.Timestamp, optional): Reference time (UTC). Defaults to current time.
+
+    Returns:
+        pd.DataFrame: df sorted by descending 'priority' (column added).
+    """
+    if now is None:
+        now = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    created = pd.to_datetime(df["date"], errors="coerce") + pd.to_timedelta(
+        df["time"].astype(str), errors="coerce"
+    )
+    # unparseable timestamp -> lowest priority, never the top
+    age_hours = (
+        ((now - created).dt.total_seconds() / 3600).clip(lower=0).fillna(np.inf)
+    )
+
+    score = pd.to_numeric(df["score"], errors="coerce").fillna(0).clip(lower=0)
+    replies = pd.to_numeric(df["number_of_replies"], errors="coerce").fillna(0)
+    engagement = 1 + np.log1p(score) + np.log1p(replies)
+
+    df = df.copy()
+    df["priority"] = engagement * 0.5 ** (age_hours / half_life_hours)
+    return df.sort_values("priority", ascending=False, kind="stable")
+
+
 ######################################################
 ######################################################
 
@@ -164,13 +234,20 @@ def _parse_last_id(last_id):
     return number, letter
 
 
-def hide_usernames(df, existing_mapping_df=None):
+def hide_usernames(df, existing_mapping_df=None, last_id=None):
     """
     Hides usernames using existing mapping and adds new authors with sequential IDs.
+    Authors and target authors are factorized together once per batch, only the
+    distinct names are looked up in the mapping and both columns are rebuilt from
+    the code arrays. New usernames are generated for unmapped authors only;
+    unmapped target authors stay None.
 
     Args:
         df (pd.DataFrame): DataFrame with 'author' and 'target_author' columns.
-        existing_mapping_df (pd.DataFrame): Existing mapping with 'original_author' and 'new_username'.
+        existing_mapping_df (pd.DataFrame): Existing mapping with 'original_author' and 'new_username'
+            (all known authors or only those present in the batch, incl. target authors).
+        last_id (str, optional): Last generated username (ex.: user0003b).
+            Defaults to the max 'new_username' in existing_mapping_df.
 
     Returns:
         tuple: (df with anonymized usernames, new mappings DataFrame)
@@ -179,9 +256,9 @@ def hide_usernames(df, existing_mapping_df=None):
     if existing_mapping_df is None or existing_mapping_df.empty:
         logging.info("No existing mapping provided - starting fresh")
         existing_mapping_df = pd.DataFrame(columns=["original_author", "new_username"])
-        last_id = "user0000a"
+        last_id = last_id or "user0000a"
     else:
-        last_id = existing_mapping_df["new_username"].max()  # e.g., user0003b
+        last_id = last_id or existing_mapping_df["new_username"].max()
         logging.info("Using existing mapping with %d entries", len(existing_mapping_df))
 
     # Check required columns
@@ -191,47 +268,87 @@ def hide_usernames(df, existing_mapping_df=None):
         logging.error("Missing required columns: %s", missing)
         raise ValueError(f"DataFrame missing required columns: {missing}")
 
-    df["original_author"] = df["author"]
-
-    # Extract authors and find new ones
-    current_authors = set(df["author"].unique())
-    known_authors = set(existing_mapping_df["original_author"])
-    new_authors = current_authors - known_authors
+    # Distinct names of both columns, each column as codes into the same uniques
+    codes, names = pd.factorize(
+        pd.concat([df["author"], df["target_author"]], ignore_index=True)
+    )
+    author_codes, target_codes = codes[: len(df)], codes[len(df) :]
+    is_author = np.zeros(len(names), dtype=bool)
+    is_author[author_codes[author_codes >= 0]] = True
+
+    # Look up distinct names only
+    known_idx = pd.Index(existing_mapping_df["original_author"]).get_indexer(names)
+    is_known = known_idx >= 0
+    usernames = np.empty(len(names) + 1, dtype=object)  # last slot: unmapped (None)
+    usernames[:-1][is_known] = existing_mapping_df["new_username"].to_numpy()[
+        known_idx[is_known]
+    ]
 
+    is_new = is_author & ~is_known
+    new_authors = names[is_new]
     logging.info("Found %d new authors", len(new_authors))
 
     # Generate new usernames if needed
     new_authors_df = pd.DataFrame(columns=["original_author", "new_username"])
-    if new_authors:
+    if len(new_authors):
         start_num, start_letter = _parse_last_id(last_id)
         new_user_ids = _generate_ids_sequential(
             len(new_authors), start_num, start_letter
         )
+        usernames[:-1][is_new] = new_user_ids
         new_authors_df = pd.DataFrame(
-            {"original_author": list(new_authors), "new_username": new_user_ids}
+            {"original_author": new_authors.to_numpy(), "new_username": new_user_ids}
         )
 
-    # Combine mappings
-    combined_mapping = pd.concat(
-        [existing_mapping_df, new_authors_df], ignore_index=True
-    )
+    # Map authors in df (code -1 -> None)
+    df["author"] = usernames[author_codes]
+    df["target_author"] = usernames[target_codes]
 
-    # Map authors in df
-    mapping_dict = dict(
-        zip(combined_mapping["original_author"], combined_mapping["new_username"])
-    )
-    df["author"] = df["author"].map(mapping_dict)
-    df["target_author"] = df["target_author"].map(mapping_dict)
-
-    logging.info("Anonymization complete. Total mappings: %d", len(combined_mapping))
+    logging.info("Anonymization complete. Distinct names: %d", len(names))
     return df, new_authors_df
 
 
+def _benchmark_hide_usernames(n_history=1_000_000, n_rows=10_000, n_authors=2_000):
+    """Times hide_usernames for one batch against a large history of authors,
+    with the full mapping and with the mapping restricted to the batch authors
+    (what main.anonymize_usernames fetches from the database)."""
+    history = pd.DataFrame(
+        {
+            "original_author": [f"author{i}" for i in range(n_history)],
+            "new_username": _generate_ids_sequential(n_history, 0, "a"),
+        }
+    )
+    rng = np.random.default_rng(0)
+    # half of the batch authors are known, half are new
+    names = np.array(
+        [f"author{i}" for i in rng.choice(n_history, n_authors // 2, replace=False)]
+        + [f"new_author{i}" for i in range(n_authors // 2)],
+        dtype=object,
+    )
+    batch = pd.DataFrame({"author": names[rng.integers(0, n_authors, n_rows)]})
+    batch["target_author"] = batch["author"].sample(frac=1, random_state=0).to_numpy()
+
+    last_id = "user0000a"  # generated ids only need to be valid for timing
+    batch_history = history[history["original_author"].isin(names)]
+    for label, mapping in [("full history", history), ("batch authors", batch_history)]:
+        start = time.time()
+        hide_usernames(batch.copy(), mapping, last_id=last_id)
+        print(
+            f"{label}: {len(mapping)} mappings, {n_rows} rows -> "
+            f"{time.time() - start:.3f}s"
+        )
+
+
 if __name__ == "__main__":
+    import sys
     from logger_config import init_logger
 
     init_logger()
 
+    if "--bench" in sys.argv:
+        _benchmark_hide_usernames()
+        sys.exit()
+
     FILE_PATH = "/Users/adam/Documents/Python/reddit_project_main/PT/raw_data.csv"
 
     # Example usage
@@ -1,4 +1,5 @@
 import os
+import sys
 import logging as lg
 import time
 import yaml
@@ -6,15 +7,33 @@ import pandas as pd
 
 # My imports
 from UT.logger_config import init_logger
-from UT.reddit_scrapper1 import get_reddit_cr, collect_reddit_data
-from UT.transform2 import transform_reddit_data, hide_usernames
+from UT.reddit_scrapper1 import (
+    get_reddit_cr,
+    collect_reddit_data,
+    iter_reddit_data,
+    load_scrape_stats,
+    save_scrape_stats,
+)
+from UT.transform2 import (
+    DELETED_BODIES,
+    transform_reddit_data,
+    hide_usernames,
+    prioritize_posts,
+)
 from UT.sql_connect3 import (
     connect_to_database,
     get_existing_post_ids,
-    get_existing_username_mapping,
+    get_existing_post_hashes,
+    get_username_mapping_for,
+    get_unscored_posts,
+    get_post_bodies,
     insert_data,
+    update_data,
+    delete_data,
 )
-from UT.bert_analysis4 import run_toxicity_analysis
+from UT.bert_analysis4 import run_toxicity_analysis, score_texts
+from UT.pipeline5 import batched, run_pipeline
+from UT.service6 import MicroBatcher, start_scoring_server
 
 ########################################################################
 
@@ -26,6 +45,27 @@ with open(CONFIG_PATH, "r") as f:
 SCRAPE_LIMIT = config.get("scrape_limit", 1)
 TARGET_COMMUNITY = config.get("target_community", "gaming")
 LOG_LEVEL = config.get("log_level", "INFO")
+ADAPTIVE_SCRAPE = config.get("adaptive_scrape", False)
+SCRAPE_MIN_LIMIT = config.get("scrape_min_limit", 25)
+HOT_THREAD_MIN_NEW_COMMENTS = config.get("hot_thread_min_new_comments", 1)
+HOT_THREAD_RECENT_HOURS = config.get("hot_thread_recent_hours", 24)
+THREAD_REFRESH_EVERY_RUNS = config.get("thread_refresh_every_runs", 6)
+SCORING_TIME_BUDGET_S = config.get("scoring_time_budget_s")
+PRIORITY_HALF_LIFE_HOURS = config.get("priority_half_life_hours", 24)
+PRIORITY_TOP_N = config.get("priority_top_n", 100)
+SCORING_CHUNK_SIZE = 128
+SCRAPE_STATS_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "cache", "scrape_stats.json"
+)
+PIPELINED = config.get("pipelined", False)
+PIPELINE_QUEUE_SIZE = config.get("pipeline_queue_size", 4)
+PIPELINE_BATCH_SIZE = config.get("pipeline_batch_size", 25)
+
+SERVICE_INTERVAL_MINUTES = config.get("service_interval_minutes", 60)
+SERVICE_HOST = config.get("service_host", "127.0.0.1")
+SERVICE_PORT = config.get("service_port", 8765)
+SERVICE_MAX_BATCH_SIZE = config.get("service_max_batch_size", 64)
+SERVICE_MAX_WAIT_MS = config.get("service_max_wait_ms", 20)
 
 
 CREDENTIALS = "/Users/adam/Documents/reddit_credencials/reddit_credentials.txt"
@@ -34,8 +74,11 @@ CREDENTIALS = "/Users/adam/Documents/reddit_credencials/reddit_credentials.txt"
 
 # knw_ids - list of post_ids that are already in the database
 # new_rows  - DataFrame with new posts and hide usernames that are not in the database
-# knw_user_map - OLD DataFrame with known authors and their new usernames
+# knw_user_map - OLD DataFrame with known authors (of the current batch) and their new usernames
 # local_mapping_df - NEW DataFrame with original and hide usernames for new authors
+# changed_rows - DataFrame with known posts whose body, score or deleted flag changed
+# rescore_rows - subset of changed_rows whose body changed (toxicity is stale)
+# unscored - DataFrame with posts without toxicity results, ordered by priority
 
 
 # 1️⃣ CONNECT TO DB
@@ -48,12 +91,50 @@ def connect_db():
 
 
 # 2️⃣ SCRAPING DATA
-def scrape_data():
+def load_community_stats():
+    """Returns (all scrape stats, stats of TARGET_COMMUNITY) or (None, None)
+    when the adaptive scrape budget is disabled."""
+    if not ADAPTIVE_SCRAPE:
+        return None, None
+    scrape_stats = load_scrape_stats(SCRAPE_STATS_PATH)
+    return scrape_stats, scrape_stats.setdefault(TARGET_COMMUNITY, {})
+
+
+def record_scrape_yield(community_stats, scraped_cn, new_cn):
+    lg.info(
+        "SCRAPE YIELD: %d NEW OF %d SCRAPED ROWS (%.1f%%).",
+        new_cn,
+        scraped_cn,
+        100 * new_cn / scraped_cn if scraped_cn else 0.0,
+    )
+    if community_stats is not None:
+        community_stats["last_yield"] = {"scraped": scraped_cn, "new": new_cn}
+
+
+def save_community_stats(scrape_stats, loaded):
+    # threads are marked as seen in the stats - save only if their rows were stored
+    if scrape_stats is None:
+        return
+    if not loaded:
+        lg.warning("LOAD STEP FAILED - SCRAPE STATS NOT SAVED.")
+        return
+    save_scrape_stats(scrape_stats, SCRAPE_STATS_PATH)
+
+
+def scrape_data(reddit_instance=None, community_stats=None):
     start = time.time()
     lg.info("SCRAPING DATA START...")
-    reddit_instance = get_reddit_cr(CREDENTIALS)
+    if reddit_instance is None:
+        reddit_instance = get_reddit_cr(CREDENTIALS)
     all_data = collect_reddit_data(
-        reddit_instance, TARGET_COMMUNITY, limit=SCRAPE_LIMIT
+        reddit_instance,
+        TARGET_COMMUNITY,
+        limit=SCRAPE_LIMIT,
+        community_stats=community_stats,
+        min_new_comments=HOT_THREAD_MIN_NEW_COMMENTS,
+        min_limit=SCRAPE_MIN_LIMIT,
+        recent_hours=HOT_THREAD_RECENT_HOURS,
+        refresh_every_runs=THREAD_REFRESH_EVERY_RUNS,
     )
     # roosterteeth, BendyAndTheInkMachine
     df = pd.DataFrame(all_data)
@@ -73,26 +154,77 @@ def transform_data(df):
 
 
 # 4️⃣ FILTER NEW ROWS
-def filter_new_rows(df, engine):
+def filter_new_rows(df, engine, knw_ids=None):
     start = time.time()
     lg.info("FILTERING NEW ROWS...")
-    knw_ids = get_existing_post_ids(engine, "reddit_posts")
+    if knw_ids is None:
+        knw_ids = get_existing_post_ids(engine, "reddit_posts")
     lg.info("length of known post_id: %d", len(knw_ids))
 
-    # FILTER NEW ROWS
-    new_rows = df[~df["post_id"].isin(knw_ids)].copy()
+    # FILTER NEW ROWS (posts of deleted authors are not stored)
+    new_rows = df[~df["post_id"].isin(knw_ids) & df["author"].notna()].copy()
     if new_rows.empty:
-        lg.info("NO NEW ROWS TO PROCESS. EXITING (%.2fs)...", time.time() - start)
+        lg.info("NO NEW ROWS TO PROCESS (%.2fs)...", time.time() - start)
         return None, knw_ids
     lg.info("FOUND (%d) NEW ROWS (%.2fs)", len(new_rows), time.time() - start)
     return new_rows, knw_ids
 
 
+# 4️⃣.1 DETECT CHANGED ROWS
+def load_post_state(engine):
+    return get_existing_post_hashes(engine).set_index("post_id")
+
+
+def detect_changed_rows(df, engine, knw_state=None):
+    # knw_state - stored hash / score indexed by post_id (load_post_state)
+    start = time.time()
+    lg.info("DETECTING CHANGED ROWS...")
+    if knw_state is None:
+        knw_state = load_post_state(engine)
+
+    # compare rescraped rows with stored hash / score (hash lookups, O(batch))
+    positions = knw_state.index.get_indexer(df["post_id"])
+    is_known = positions >= 0
+    seen = df[is_known].copy()
+    stored = knw_state.iloc[positions[is_known]]
+    seen["body_hash_old"] = stored["body_hash"].to_numpy()
+    seen["score_old"] = stored["score"].to_numpy()
+    seen["deleted_old"] = stored["deleted"].to_numpy()
+
+    # '[deleted]' / '[removed]' never overwrite the stored text (nor its scores),
+    # the deletion is recorded in the 'deleted' flag instead
+    placeholder = seen["body"].isin(DELETED_BODIES)
+    seen.loc[placeholder, ["body", "body_hash"]] = None
+
+    body_changed = ~placeholder & (seen["body_hash"] != seen["body_hash_old"])
+    score_changed = seen["score"] != seen["score_old"]
+    deleted_changed = seen["deleted"] != seen["deleted_old"].astype(bool)
+
+    changed_rows = seen[body_changed | score_changed | deleted_changed]
+    rescore_rows = seen[body_changed]
+    lg.info(
+        "CHECKED (%d) KNOWN ROWS: %d CHANGED, %d TO RESCORE (%.2fs)",
+        len(seen),
+        len(changed_rows),
+        len(rescore_rows),
+        time.time() - start,
+    )
+    if changed_rows.empty:
+        return None, None
+    return changed_rows, rescore_rows
+
+
 # 5️⃣ ANONYMIZE USERNAMES
 def anonymize_usernames(new_rows, engine):
     lg.info("ANONYMIZING USERNAMES...")
-    knw_user_map = get_existing_username_mapping(engine)
-    new_rows, local_mapping_df = hide_usernames(new_rows, knw_user_map)
+    # fetch mapping only for authors / target authors of this batch
+    names = pd.concat([new_rows["author"], new_rows["target_author"]])
+    knw_user_map, last_username = get_username_mapping_for(
+        engine, names.dropna().unique()
+    )
+    new_rows, local_mapping_df = hide_usernames(
+        new_rows, knw_user_map, last_id=last_username
+    )
     lg.info("HIDING ORIGINAL USERNAMES SUCCESSFULL.")
 
     return new_rows, local_mapping_df
@@ -107,22 +239,20 @@ def insert_authors(local_mapping_df, engine):
         local_mapping_df = local_mapping_df.rename(
             columns={"author": "original_author"}
         )
-        insert_data(
+        return insert_data(
             data=local_mapping_df,  # DataFrame with new authors
             engine_instance=engine,  # SQLAlchemy engine
             table_name="unique_authors",  # Target table name
         )
     else:
         lg.info("No new authors to insert.")
+        return True
 
 
 # 7️⃣ INSERT NEW POSTS
 def insert_posts(new_rows, engine):
     lg.info("INSERTING INTO: 'reddit_posts'...")
-    # drop original_author column if exists
-    if "original_author" in new_rows.columns:
-        new_rows = new_rows.drop(columns=["original_author"])
-    insert_data(
+    return insert_data(
         data=new_rows,
         engine_instance=engine,
         table_name="reddit_posts",
@@ -136,7 +266,7 @@ def analyze_toxicity(new_rows):
         lg.info("No new posts to analyze for toxicity.")
         return
     lg.info("RUNNING TOXICITY ANALYSIS ON NEW RECORDS...")
-    df_new_ids = new_rows[["post_id", "body"]].copy()
+    df_new_ids = new_rows[["post_id", "body"]]
     lg.info("Analyzing %d new posts for toxicity...", len(df_new_ids))
 
     # run bert
@@ -148,17 +278,275 @@ def analyze_toxicity(new_rows):
 # 9️⃣ INSERT TOXICITY RESULTS
 def insert_toxicity(results, engine):
     # insert data to the database
-    if "body" in results.columns:
-        results = results.drop(columns=["body"])
-
     lg.info("INSERTING INTO: 'toxicity_results")
-    insert_data(
+    return insert_data(
         data=results,
         engine_instance=engine,
         table_name="toxicity_results",
     )
 
 
+# 🔟 UPDATE CHANGED POSTS
+def update_changed_posts(changed_rows, engine):
+    lg.info("UPDATING CHANGED ROWS IN: 'reddit_posts'...")
+    update_data(
+        data=changed_rows,
+        engine_instance=engine,
+        table_name="reddit_posts",
+        key_column="post_id",
+        columns=["body", "score", "number_of_replies", "body_hash", "deleted"],
+    )
+
+
+# 1️⃣1️⃣ INVALIDATE STALE TOXICITY RESULTS
+def invalidate_toxicity(rescore_rows, engine):
+    # posts without toxicity results are picked up by the next scoring pass
+    if rescore_rows is None or rescore_rows.empty:
+        lg.info("No edited posts to rescore.")
+        return
+
+    lg.info("DELETING STALE ROWS FROM: 'toxicity_results'...")
+    delete_data(
+        keys=rescore_rows["post_id"],
+        engine_instance=engine,
+        table_name="toxicity_results",
+        key_column="post_id",
+    )
+
+
+# 1️⃣2️⃣ PRIORITY TOXICITY ANALYSIS & INSERT
+def scoring_deadline(start):
+    return start + SCORING_TIME_BUDGET_S if SCORING_TIME_BUDGET_S else None
+
+
+def score_by_priority(engine, deadline=None):
+    """Scores all posts without toxicity results (this run + deferred from earlier
+    runs), hottest first, inserting every chunk right away. Only ids and priority
+    inputs of the backlog are loaded, bodies are fetched one chunk at a time.
+    Stops starting new chunks after the deadline (default: SCORING_TIME_BUDGET_S
+    from now), the rest is deferred to the next run."""
+    start = time.time()
+    lg.info("RUNNING PRIORITY TOXICITY ANALYSIS...")
+    unscored = get_unscored_posts(engine)
+    if unscored.empty:
+        lg.info("No unscored posts to analyze for toxicity.")
+        return
+
+    unscored = prioritize_posts(unscored, half_life_hours=PRIORITY_HALF_LIFE_HOURS)
+    top_n = min(PRIORITY_TOP_N, len(unscored))
+    lg.info("Analyzing %d unscored posts for toxicity...", len(unscored))
+
+    progress = {"scored": 0, "top_n_time": None}
+
+    def write_chunk(results):
+        # failed inserts stay unscored in the DB (deferred to the next run)
+        if insert_toxicity(results, engine):
+            progress["scored"] += len(results)
+        if progress["top_n_time"] is None and progress["scored"] >= top_n:
+            progress["top_n_time"] = time.time() - start
+            lg.info(
+                "TOP %d PRIORITY POSTS SCORED IN %.2fs.", top_n, progress["top_n_time"]
+            )
+
+    if deadline is None:
+        deadline = scoring_deadline(start)
+    post_ids = unscored["post_id"].tolist()
+    for chunk_start in range(0, len(post_ids), SCORING_CHUNK_SIZE):
+        if deadline is not None and time.time() > deadline:
+            break
+        chunk = get_post_bodies(
+            engine, post_ids[chunk_start : chunk_start + SCORING_CHUNK_SIZE]
+        )
+        if not chunk.empty:
+            write_chunk(run_toxicity_analysis(chunk, chunk_size=SCORING_CHUNK_SIZE))
+
+    if progress["top_n_time"] is None:
+        lg.info(
+            "TIME BUDGET EXHAUSTED: %d OF TOP %d PRIORITY POSTS SCORED IN %.2fs.",
+            progress["scored"],
+            top_n,
+            time.time() - start,
+        )
+
+    lg.info(
+        "TOXICITY ANALYSIS COMPLETE: %d SCORED, %d DEFERRED (%.2fs).",
+        progress["scored"],
+        len(unscored) - progress["scored"],
+        time.time() - start,
+    )
+
+
+# 🔁 PIPELINED ETL
+def run_pipelined(engine, reddit_instance=None):
+    """Runs scraping, DB I/O and toxicity scoring concurrently.
+    Batches of PIPELINE_BATCH_SIZE scraped submissions flow through:
+    scrape -> load -> score -> write, so DB round trips are paid once per batch.
+    Known ids and stored hashes are fetched once; known ids are kept up to date in
+    memory, stored hashes are not (every post is scraped once per run).
+    Loaded posts join a pool; for every batch the score stage scores the top posts
+    of the pool by priority (at least as many as the batch added, within the time
+    budget). Whatever is left in the pool is scored by score_by_priority at the end.
+    """
+    lg.info("RUNNING PIPELINED ETL...")
+    deadline = scoring_deadline(time.time())
+    scrape_stats, community_stats = load_community_stats()
+    state = {
+        "knw_ids": get_existing_post_ids(engine, "reddit_posts"),
+        "knw_state": load_post_state(engine),
+        "scraped_cn": 0,
+        "new_cn": 0,
+        "loaded_cn": 0,  # batches whose inserts succeeded
+        "pool": None,  # loaded posts waiting for scoring
+    }
+    pool_columns = ["post_id", "body", "score", "number_of_replies", "date", "time"]
+
+    def load_stage(submissions):
+        rows = [row for submission_data in submissions for row in submission_data]
+        df = transform_reddit_data(pd.DataFrame(rows))
+        new_rows, _ = filter_new_rows(df, engine, state["knw_ids"])
+        state["scraped_cn"] += len(df)
+        state["new_cn"] += 0 if new_rows is None else len(new_rows)
+        changed_rows, rescore_rows = detect_changed_rows(
+            df, engine, state["knw_state"]
+        )
+        work = []
+        loaded = True
+
+        if new_rows is not None:
+            new_rows, local_mapping_df = anonymize_usernames(new_rows, engine)
+            authors_ok = insert_authors(local_mapping_df, engine)
+            posts_ok = insert_posts(new_rows, engine)
+            loaded = authors_ok and posts_ok
+            state["knw_ids"].update(new_rows["post_id"])
+            work.append(new_rows[pool_columns])
+
+        if changed_rows is not None:
+            update_changed_posts(changed_rows, engine)
+            invalidate_toxicity(rescore_rows, engine)
+            if not rescore_rows.empty:
+                work.append(rescore_rows[pool_columns])
+
+        state["loaded_cn"] += loaded
+        return work or None
+
+    def score_stage(work):
+        if deadline is not None and time.time() > deadline:
+            # budget used up - posts stay unscored in the DB for the next run
+            state["pool"] = None
+            return None
+        pool = pd.concat([state["pool"]] + work, ignore_index=True)
+        pool = prioritize_posts(pool, half_life_hours=PRIORITY_HALF_LIFE_HOURS)
+        # keep pace with the load stage: score at least what this batch added
+        n_rows = max(SCORING_CHUNK_SIZE, sum(len(rows) for rows in work))
+        state["pool"] = pool.iloc[n_rows:]
+        return analyze_toxicity(pool.iloc[:n_rows])
+
+    def write_stage(results):
+        insert_toxicity(results, engine)
+
+    if reddit_instance is None:
+        reddit_instance = get_reddit_cr(CREDENTIALS)
+    all_stats = run_pipeline(
+        source=batched(
+            iter_reddit_data(
+                reddit_instance,
+                TARGET_COMMUNITY,
+                limit=SCRAPE_LIMIT,
+                community_stats=community_stats,
+                min_new_comments=HOT_THREAD_MIN_NEW_COMMENTS,
+                min_limit=SCRAPE_MIN_LIMIT,
+                recent_hours=HOT_THREAD_RECENT_HOURS,
+                refresh_every_runs=THREAD_REFRESH_EVERY_RUNS,
+            ),
+            PIPELINE_BATCH_SIZE,
+        ),
+        stages=[
+            ("load", load_stage),
+            ("score", score_stage),
+            ("write", write_stage),
+        ],
+        source_name="scrape",
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    record_scrape_yield(community_stats, state["scraped_cn"], state["new_cn"])
+    # every scraped batch went through the load stage without errors
+    save_community_stats(scrape_stats, state["loaded_cn"] == all_stats[0].items)
+    # rest of the pool + posts deferred by earlier runs
+    score_by_priority(engine, deadline=deadline)
+
+
+def run_etl_cycle(engine, reddit_instance=None):
+    """One scrape -> load -> score run (steps 2️⃣ - 1️⃣2️⃣)."""
+    if PIPELINED:
+        run_pipelined(engine, reddit_instance)
+        return
+
+    scrape_stats, community_stats = load_community_stats()
+    raw_df = scrape_data(reddit_instance, community_stats)
+    transformed_df = transform_data(raw_df)
+
+    new_rows, knw_ids = filter_new_rows(transformed_df, engine)
+    record_scrape_yield(
+        community_stats,
+        len(transformed_df),
+        0 if new_rows is None else len(new_rows),
+    )
+    changed_rows, rescore_rows = detect_changed_rows(transformed_df, engine)
+
+    loaded = True
+    if new_rows is not None:
+        new_rows, local_mapping_df = anonymize_usernames(new_rows, engine)
+        authors_ok = insert_authors(local_mapping_df, engine)
+        posts_ok = insert_posts(new_rows, engine)
+        loaded = authors_ok and posts_ok
+    save_community_stats(scrape_stats, loaded)
+
+    if changed_rows is not None:
+        update_changed_posts(changed_rows, engine)
+        invalidate_toxicity(rescore_rows, engine)
+
+    # new, edited and previously deferred posts - hottest first
+    score_by_priority(engine)
+
+
+# 🛎 SERVICE MODE
+def run_service():
+    """Long-running mode: BERT model, Reddit session and DB connection pool stay
+    loaded, ETL cycles run every SERVICE_INTERVAL_MINUTES and a local HTTP endpoint
+    scores arbitrary texts on demand (POST /score {"texts": [...]})."""
+    init_logger()
+    lg.info("=== START OF ETL SERVICE ===")
+
+    engine = connect_db()
+    reddit_instance = get_reddit_cr(CREDENTIALS)
+    batcher = MicroBatcher(
+        score_texts,
+        max_batch_size=SERVICE_MAX_BATCH_SIZE,
+        max_wait_ms=SERVICE_MAX_WAIT_MS,
+    )
+    server = start_scoring_server(batcher, host=SERVICE_HOST, port=SERVICE_PORT)
+
+    try:
+        while True:
+            start_time = time.time()
+            lg.info("=== START OF ETL CYCLE ===")
+            try:
+                run_etl_cycle(engine, reddit_instance)
+            except Exception as e:
+                lg.error(f"AN ERROR OCCURRED: {e}")
+            lg.info("=== END OF ETL CYCLE (%.2fs) ===", time.time() - start_time)
+
+            sleep_time = SERVICE_INTERVAL_MINUTES * 60 - (time.time() - start_time)
+            time.sleep(max(sleep_time, 0))
+    except KeyboardInterrupt:
+        lg.info("STOPPING ETL SERVICE...")
+    finally:
+        server.shutdown()
+        batcher.stop()
+        engine.dispose()
+        lg.info("=== END OF ETL SERVICE ===")
+
+
 def main():
     init_logger()
     lg.info("=== START OF ETL PROCESS ===")
@@ -166,18 +554,7 @@ def main():
 
     try:
         engine = connect_db()
-        raw_df = scrape_data()
-        transformed_df = transform_data(raw_df)
-
-        new_rows, knw_ids = filter_new_rows(transformed_df, engine)
-        if new_rows is None:
-            return
-
-        new_rows, local_mapping_df = anonymize_usernames(new_rows, engine)
-        insert_authors(local_mapping_df, engine)
-        insert_posts(new_rows, engine)
-        results = analyze_toxicity(new_rows)
-        insert_toxicity(results, engine)
+        run_etl_cycle(engine)
 
     except Exception as e:
         lg.error(f"AN ERROR OCCURRED: {e}")
@@ -188,4 +565,7 @@ def main():
 ##########################################################
 ##########################################################
 if __name__ == "__main__":
-    main()
+    if "--service" in sys.argv:
+        run_service()
+    else:
+        main()
@@ -22,6 +22,8 @@ CREATE TABLE reddit_posts (
     number_of_replies DECIMAL(10,1),
     date DATE,
     time TIME,
+    body_hash CHAR(32),
+    deleted BOOLEAN DEFAULT FALSE,
     FOREIGN KEY (author) REFERENCES unique_authors(new_username) ON DELETE CASCADE
 );
 
@@ -46,6 +48,14 @@ CREATE TABLE toxicity_results (
 ALTER TABLE unique_authors
 RENAME COLUMN new_name TO new_username;
 
+--add body hash for change detection (edited / rescored posts)
+ALTER TABLE reddit_posts
+ADD COLUMN body_hash CHAR(32);
+
+--mark posts removed / with deleted author (stored text and scores are kept)
+ALTER TABLE reddit_posts
+ADD COLUMN deleted BOOLEAN DEFAULT FALSE;
+
 ----------------------------------------------
 ------------- Indexes ------------------------
 ----------------------------------------------;